@@ -16,7 +16,21 @@ from typing import List, Dict
 import re
 import uuid
 import asyncio
-from bailii import BailiiScraper
+import gzip
+import zlib
+import hashlib
+from werkzeug.wsgi import get_input_stream
+from werkzeug.exceptions import ClientDisconnected
+from whitenoise import WhiteNoise
+from bailii import (BailiiScraper, CLIENTS, get_upstream_metrics, make_httpx_client,
+                    normalise_query, upstream_setting)
+from chat_index import ChatSearchIndex, make_snippet
+from jobs import JobQueue, DONE, FAILED
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 # Load environment variables only in development
 if not os.getenv('PRODUCTION'):
@@ -95,6 +109,51 @@ def extract_opinion_text(opinion_data):
 app = Flask(__name__, static_folder='static')
 app.secret_key = os.urandom(24)  # For session management
 
+# Serve static assets. Each file is also published under a content-hashed name
+# (css/app.3f9a1c2b4d5e.css) that is cached as immutable; templates link to that
+# via static_url(). Plain names are only cached briefly.
+STATIC_ROOT = os.path.join(app.root_path, 'static')
+STATIC_MAX_AGE = upstream_setting('static', 'MAX_AGE', 300)
+STATIC_URLS = {}
+
+def fingerprint_static_files():
+    """Map every file under static/ to a content-hashed URL."""
+    for dirpath, _, filenames in os.walk(STATIC_ROOT):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            name = os.path.relpath(path, STATIC_ROOT).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                digest = hashlib.sha256(f.read()).hexdigest()[:12]
+            base, ext = os.path.splitext(name)
+            STATIC_URLS[name] = (f"/static/{base}.{digest}{ext}", path)
+
+# Hashes are computed before WhiteNoise is built, since it applies the immutable test as files are added
+fingerprint_static_files()
+FINGERPRINTED_URLS = {url for url, _ in STATIC_URLS.values()}
+
+def is_fingerprinted(path, url):
+    return url in FINGERPRINTED_URLS
+
+static_files = WhiteNoise(app.wsgi_app, root=STATIC_ROOT, prefix='static/',
+                          max_age=STATIC_MAX_AGE, immutable_file_test=is_fingerprinted)
+for url, path in STATIC_URLS.values():
+    static_files.add_file_to_dictionary(url, path)
+app.wsgi_app = static_files
+
+def static_url(filename):
+    """URL of the fingerprinted copy of a static file, falling back to the plain one."""
+    if filename in STATIC_URLS:
+        return STATIC_URLS[filename][0]
+    return url_for('static', filename=filename)
+
+@app.context_processor
+def inject_static_url():
+    return {'static_url': static_url}
+
+# Responses smaller than this are not worth compressing
+COMPRESS_MIN_SIZE = 500
+COMPRESS_MIMETYPES = {'application/json', 'text/html'}
+
 # Enable debug mode in development
 app.config['DEBUG'] = not os.getenv('PRODUCTION', False)
 
@@ -109,25 +168,34 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 # Configure OpenAI client
-api_key = os.getenv('OPENAI_API_KEY')
-if not api_key:
-    print("Warning: OPENAI_API_KEY not found in environment variables")
-    client = None
-else:
+def make_openai_client():
+    """Build the OpenAI client with a pooled keep-alive HTTP client."""
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key:
+        print("Warning: OPENAI_API_KEY not found in environment variables")
+        return None
     try:
-        client = OpenAI(
+        openai_client = OpenAI(
             api_key=api_key,
             max_retries=2,
-            timeout=20.0,
+            timeout=upstream_setting('openai', 'TIMEOUT', 20.0),
+            http_client=make_httpx_client('openai', default_timeout=20.0),
             default_headers={
                 "OpenAI-Beta": "assistants=v1"
             }
         )
-        print("OpenAI client initialized successfully")
+        print(f"OpenAI client initialized successfully in process {os.getpid()}")
+        return openai_client
     except Exception as e:
         print(f"Error initializing OpenAI client: {e}")
         traceback.print_exc()
-        client = None
+        return None
+
+CLIENTS.register('openai', make_openai_client)
+
+def get_client():
+    """Return this worker's shared OpenAI client (None if not configured)."""
+    return CLIENTS.get('openai')
 
 # User database
 USERS = {
@@ -157,9 +225,108 @@ USERS = {
     }
 }
 
+# Background job queue for long-running research tool calls
+JOBS_DB_PATH = '/tmp/jobs.sqlite3' if os.getenv('PRODUCTION') else 'jobs.sqlite3'
+JOB_WAIT_TIMEOUT = upstream_setting('job', 'WAIT_TIMEOUT', 300)
+# SSE comment interval while a job runs, so proxies do not drop an idle stream
+JOB_KEEPALIVE_SECONDS = 15
+# The lease must stay well under JOB_WAIT_TIMEOUT so crashed jobs rerun while the chat waits
+JOBS = JobQueue(JOBS_DB_PATH, max_workers=upstream_setting('job', 'WORKERS', 2),
+                lease_seconds=upstream_setting('job', 'LEASE_SECONDS', 90))
+
 # Store chats in memory (in production, use a proper database)
 CHATS = {}
 
+# Inverted index over message content, kept in sync as messages are appended
+SEARCH_INDEX = ChatSearchIndex()
+
+# Per-chat (version, last_modified) counters used for ETag/Last-Modified.
+# BOOT_ID keeps ETags from colliding across restarts and gunicorn workers.
+CHAT_VERSIONS = {}
+BOOT_ID = uuid.uuid4().hex
+
+def touch_chat(username, chat_id, modified=None):
+    """Bump a chat's version after it changes."""
+    version, _ = CHAT_VERSIONS.get((username, chat_id), (0, 0))
+    CHAT_VERSIONS[(username, chat_id)] = (version + 1, modified or time.time())
+
+def append_message(username, chat_id, message):
+    """Append a message to a chat, index it for search and bump its version."""
+    messages = CHATS[username][chat_id]
+    messages.append(message)
+    SEARCH_INDEX.add_message(username, chat_id, len(messages) - 1, message)
+    touch_chat(username, chat_id)
+
+def chats_validators(*scope, salt=''):
+    """Return (etag, last_modified) for the given (username, chat_id) pairs.
+
+    ``salt`` separates responses that cover the same chats but differ
+    otherwise, such as the per-user index page.
+    """
+    digest = hashlib.sha1(f"{BOOT_ID}:{salt}".encode())
+    last_modified = 0
+    for key in scope:
+        version, modified = CHAT_VERSIONS.get(key, (0, 0))
+        digest.update(f"{key[0]}/{key[1]}:{version};".encode())
+        last_modified = max(last_modified, modified)
+    return digest.hexdigest(), last_modified
+
+def user_chat_scope(username, is_admin):
+    """All (username, chat_id) pairs visible to this user."""
+    users = CHATS.keys() if is_admin else [username]
+    return [(user, chat_id) for user in users for chat_id in CHATS.get(user, {})]
+
+def last_modified_is_settled(last_modified):
+    """HTTP dates have one-second precision, so a change in the current second is ambiguous.
+
+    Once that second has passed, any later change lands in a later second.
+    """
+    return int(last_modified) < int(time.time())
+
+def is_not_modified(etag, last_modified):
+    """Check the request's conditional headers against current validators."""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified and last_modified_is_settled(last_modified):
+        return int(last_modified) <= request.if_modified_since.timestamp()
+    return False
+
+def conditional_response(etag, last_modified, build):
+    """Return 304 if the client copy is current, otherwise build the response."""
+    if is_not_modified(etag, last_modified):
+        response = Response(status=304)
+    else:
+        response = build()
+    response.set_etag(etag, weak=True)
+    # Only advertise a Last-Modified that a same-second change cannot make stale
+    if last_modified and last_modified_is_settled(last_modified):
+        response.last_modified = last_modified
+    # Always revalidate; unchanged chats come back as an empty 304
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@app.after_request
+def compress_response(response):
+    """Brotli/gzip-compress JSON and HTML responses the client accepts."""
+    if (response.direct_passthrough or response.is_streamed or response.status_code < 200
+            or response.status_code in (204, 304) or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESS_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        response.set_data(brotli.compress(data, quality=5))
+        response.headers['Content-Encoding'] = 'br'
+    elif accepted['gzip']:
+        response.set_data(gzip.compress(data, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -168,6 +335,16 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'username' not in session:
+            return redirect(url_for('login'))
+        if not session.get('is_admin', False):
+            return jsonify({'error': 'Admin access required'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
@@ -205,14 +382,16 @@ def index():
         if not CHATS[username]:
             new_chat_id = str(int(time.time()))
             CHATS[username][new_chat_id] = []
+            touch_chat(username, new_chat_id)
         user_chats = CHATS[username]
     
-    return render_template('index.html',
+    etag, last_modified = chats_validators(*user_chat_scope(username, is_admin), salt=f"index:{username}")
+    return conditional_response(etag, last_modified, lambda: Response(render_template('index.html',
                          username=username,
                          display_name=user_info['display_name'],
                          full_name=user_info['full_name'],
                          is_admin=is_admin,
-                         chats=user_chats)
+                         chats=user_chats)))
 
 @app.route('/api/new-chat', methods=['POST'])
 @login_required
@@ -226,6 +405,7 @@ def new_chat():
     # Create new chat ID using UUID
     new_chat_id = str(uuid.uuid4())
     CHATS[username][new_chat_id] = []
+    touch_chat(username, new_chat_id)
     
     # Save chats after creating new chat
     save_chats_to_file()
@@ -263,7 +443,7 @@ def chat():
         print(f"Initialized chat {chat_id} for user {username}")
     
     # Add user message to chat history
-    CHATS[username][chat_id].append({
+    append_message(username, chat_id, {
         'role': 'user',
         'content': user_input,
         'timestamp': time.time()
@@ -281,7 +461,7 @@ def chat():
         ]
         
         # First, check if tool usage is likely needed
-        completion = client.chat.completions.create(
+        completion = get_client().chat.completions.create(
             model="gpt-4o-mini",
             messages=messages,
             tools=TOOLS,
@@ -293,6 +473,7 @@ def chat():
             # Process non-streaming tool calls
             tool_calls = completion.choices[0].message.tool_calls
             response_content = completion.choices[0].message.content or ""
+            pending_jobs = []
             
             # Process each tool call
             for tool_call in tool_calls:
@@ -313,39 +494,14 @@ def chat():
                         print("Error: Missing 'query' parameter for search_bailii.")
                         return jsonify({'error': 'Missing query parameter for search_bailii.'}), 500
                     
-                    # Use BailiiScraper to perform the search
-                    print(f"Performing BAILII search for: {search_query}")
-                    scraper = BailiiScraper()
-                    try:
-                        search_results = asyncio.run(scraper.run_scraper(search_query))
-                        scraped_contents = search_results if isinstance(search_results, list) else []
-                    except Exception as e:
-                        print(f"Error during BAILII search: {e}")
-                        traceback.print_exc()
-                        return jsonify({'error': f'Error during BAILII search: {str(e)}'}), 500
-
-                    # Process each search result and extract text
-                    summaries = []
-                    for result in scraped_contents:
-                        if isinstance(result, str):  # Check if it's HTML content
-                            # Directly use the HTML content with the summarizer
-                            summary = summarize_tool_results(result, search_query)
-                            summaries.append(summary)
-                        else:
-                            print(f"Unexpected result type: {type(result)}")
-                            return jsonify({'error': 'Unexpected result type from BailiiScraper.'}), 500
-
-                    # Combine summaries
-                    combined_summary = "\n".join(summaries)
-
-                    
-                    CHATS[username][chat_id].append({
-                        'role': 'assistant',
-                        'name': function_name,
-                        'content': combined_summary,
-                        'tool_call_id': tool_call_id,
-                        'timestamp': time.time()
-                    })
+                    # Research runs on the background job queue; results are streamed below
+                    job_id = JOBS.submit(
+                        'search_bailii',
+                        {'query': search_query},
+                        dedupe_key=f"search_bailii:{normalise_query(search_query)}"
+                    )
+                    print(f"Submitted BAILII research job {job_id} for: {search_query}")
+                    pending_jobs.append((tool_call_id, function_name, job_id))
                 
                 elif function_name == "generate_random_number":
                     min_value = function_args.get("min_value")
@@ -361,7 +517,7 @@ def chat():
                     
                     random_number = generate_random_number(min_value, max_value)
                     
-                    CHATS[username][chat_id].append({
+                    append_message(username, chat_id, {
                         'role': 'assistant',
                         'name': function_name,
                         'content': str(random_number),
@@ -369,47 +525,85 @@ def chat():
                         'timestamp': time.time()
                     })
             
-            # After tool calls, get final response with tool outputs
-            final_messages = messages.copy()
-            for msg in CHATS[username][chat_id]:
-                if msg['role'] == 'assistant' and 'tool_call_id' in msg:
-                    final_messages.append({
-                        'role': 'assistant',
-                        'tool_call_id': msg['tool_call_id'],
-                        'name': msg['name'],
-                        'content': msg['content']
-                    })
-            
-            final_completion = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=final_messages,
-                stream=True
-            )
-            
             def generate():
                 nonlocal response_content
-                for chunk in final_completion:
-                    delta = chunk.choices[0].delta
-                    if delta.content:
-                        content = delta.content
-                        response_content += content
-                        yield f"data: {json.dumps({'content': content, 'chat_id': chat_id})}\n\n"
-                
-                # Save AI response to chat history
-                CHATS[username][chat_id].append({
-                    'role': 'assistant',
-                    'content': response_content,
-                    'timestamp': time.time()
-                })
+
+                try:
+                    # Stream job progress until each research job finishes. The research itself
+                    # runs on the job pool; this gthread request thread only polls SQLite once a
+                    # second, which keeps the answer in one stream instead of a client-side
+                    # polling loop. /api/jobs/<id> serves clients that lose the stream.
+                    for tool_call_id, function_name, job_id in pending_jobs:
+                        job = None
+                        last_status = None
+                        for job in JOBS.wait(job_id, timeout=JOB_WAIT_TIMEOUT, keepalive=JOB_KEEPALIVE_SECONDS):
+                            if job['status'] == last_status:
+                                yield ": keep-alive\n\n"
+                                continue
+                            last_status = job['status']
+                            yield f"data: {json.dumps({'job_id': job_id, 'job_status': job['status'], 'chat_id': chat_id})}\n\n"
+
+                        if job and job['status'] == DONE:
+                            content = job['result']['summary']
+                        elif job and job['status'] == FAILED:
+                            content = f"BAILII research failed: {job['error']}"
+                        else:
+                            content = f"BAILII research is still running (job {job_id}); ask again shortly to use its results."
+
+                        append_message(username, chat_id, {
+                            'role': 'assistant',
+                            'name': function_name,
+                            'content': content,
+                            'tool_call_id': tool_call_id,
+                            'job_id': job_id,
+                            'timestamp': time.time()
+                        })
+
+                    # After tool calls, get final response with tool outputs
+                    final_messages = messages.copy()
+                    for msg in CHATS[username][chat_id]:
+                        if msg['role'] == 'assistant' and 'tool_call_id' in msg:
+                            final_messages.append({
+                                'role': 'assistant',
+                                'tool_call_id': msg['tool_call_id'],
+                                'name': msg['name'],
+                                'content': msg['content']
+                            })
+
+                    final_completion = get_client().chat.completions.create(
+                        model="gpt-4o-mini",
+                        messages=final_messages,
+                        stream=True
+                    )
+
+                    for chunk in final_completion:
+                        delta = chunk.choices[0].delta
+                        if delta.content:
+                            content = delta.content
+                            response_content += content
+                            yield f"data: {json.dumps({'content': content, 'chat_id': chat_id})}\n\n"
                 
-                # Save chats after AI response
-                save_chats_to_file()
+                    # Save AI response to chat history
+                    append_message(username, chat_id, {
+                        'role': 'assistant',
+                        'content': response_content,
+                        'timestamp': time.time()
+                    })
+
+                except Exception as e:
+                    # Headers are already sent, so report the failure as a stream event
+                    print(f"Error in chat stream: {e}")
+                    traceback.print_exc()
+                    yield f"data: {json.dumps({'error': str(e), 'chat_id': chat_id})}\n\n"
+                finally:
+                    # Keep tool results even if the final completion failed
+                    save_chats_to_file()
             
             return Response(generate(), content_type='text/event-stream')
             
         else:
             # No tool calls needed, just stream the response
-            streaming_completion = client.chat.completions.create(
+            streaming_completion = get_client().chat.completions.create(
                 model="gpt-4o-mini",
                 messages=messages,
                 stream=True
@@ -425,7 +619,7 @@ def chat():
                         yield f"data: {json.dumps({'content': content, 'chat_id': chat_id})}\n\n"
                 
                 # Save AI response to chat history
-                CHATS[username][chat_id].append({
+                append_message(username, chat_id, {
                     'role': 'assistant',
                     'content': response_content,
                     'timestamp': time.time()
@@ -441,11 +635,13 @@ def chat():
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+SUMMARY_ERROR = "Error summarizing tool results."
+
 def summarize_tool_results(tool_results, query):
     """Summarizes the results from a tool call using another OpenAI completion."""
     try:
         prompt = f"Please summarize the following search results from BAILII, based on the query '{query}'. Focus on the most relevant information.\n\n{tool_results}"
-        completion = client.chat.completions.create(
+        completion = get_client().chat.completions.create(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are a helpful assistant that summarizes search results BE EXTREMELY IN DETAIL. please cite links where possible"},
@@ -456,7 +652,52 @@ def summarize_tool_results(tool_results, query):
         return completion.choices[0].message.content
     except Exception as e:
         print(f"Error summarizing tool results: {e}")
-        return "Error summarizing tool results."
+        return SUMMARY_ERROR
+
+def run_bailii_research(payload):
+    """Job handler: search BAILII and summarise each result."""
+    search_query = payload['query']
+    print(f"Performing BAILII search for: {search_query}")
+    scraper = BailiiScraper()
+    search_results = asyncio.run(scraper.run_scraper(search_query))
+    scraped_contents = search_results if isinstance(search_results, list) else []
+
+    summaries = []
+    for result in scraped_contents:
+        if isinstance(result, str):
+            summary = summarize_tool_results(result, search_query)
+            if summary and summary != SUMMARY_ERROR:
+                summaries.append(summary)
+        else:
+            raise TypeError(f"Unexpected result type from BailiiScraper: {type(result)}")
+
+    # Raising marks the job failed, so the dedupe cache never reuses an empty result
+    if not summaries:
+        raise RuntimeError(f"No usable BAILII results for '{search_query}'")
+
+    return {'query': search_query, 'summary': "\n".join(summaries)}
+
+JOBS.register('search_bailii', run_bailii_research)
+
+# Without --preload this import runs in each gunicorn worker after fork, so the
+# pool starts immediately and resumes requeued jobs; get/submit restart it if
+# the process was forked after import.
+JOBS.ensure_started()
+
+@app.route('/api/jobs/<job_id>')
+@login_required
+def get_job(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({
+        'job_id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'result': job['result'],
+        'error': job['error'],
+        'updated_at': job['updated_at']
+    })
 
 def save_chats_to_file():
     """Save chats to a file for persistence"""
@@ -475,6 +716,10 @@ def load_chats_from_file():
         if os.path.exists('chats.json'):
             with open('chats.json', 'r') as f:
                 CHATS = json.load(f)
+            SEARCH_INDEX.build(CHATS)
+            for username, user_chats in CHATS.items():
+                for chat_id, messages in user_chats.items():
+                    touch_chat(username, chat_id, max((m.get('timestamp') or 0 for m in messages), default=0))
             print("Chats loaded successfully")
             print(f"Loaded chats: {json.dumps(CHATS, indent=2)}")
         else:
@@ -494,13 +739,17 @@ def get_chat(chat_id):
     
     if is_admin:
         # Admin can view any chat
-        for user_chats in CHATS.values():
+        for owner, user_chats in CHATS.items():
             if chat_id in user_chats and user_chats[chat_id]:
-                return jsonify({'messages': user_chats[chat_id]})
+                etag, last_modified = chats_validators((owner, chat_id))
+                return conditional_response(etag, last_modified,
+                                            lambda: jsonify({'messages': user_chats[chat_id]}))
     else:
         # Regular users can only view their own chats
         if username in CHATS and chat_id in CHATS[username] and CHATS[username][chat_id]:
-            return jsonify({'messages': CHATS[username][chat_id]})
+            etag, last_modified = chats_validators((username, chat_id))
+            return conditional_response(etag, last_modified,
+                                        lambda: jsonify({'messages': CHATS[username][chat_id]}))
     
     return jsonify({'messages': []})
 
@@ -515,7 +764,199 @@ def get_chats():
     else:
         chats_data = CHATS.get(username, {})
     
-    return jsonify({'chats': chats_data})
+    etag, last_modified = chats_validators(*user_chat_scope(username, is_admin))
+    return conditional_response(etag, last_modified, lambda: jsonify({'chats': chats_data}))
+
+@app.route('/api/search')
+@login_required
+def search_chats():
+    """Full-text search over the current user's messages (all users for admin)."""
+    username = session.get('username')
+    is_admin = session.get('is_admin', False)
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Missing search query'}), 400
+
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), 100))
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+
+    if is_admin:
+        target_user = request.args.get('user')
+        usernames = [target_user] if target_user else None
+    else:
+        usernames = [username]
+
+    def is_live(owner, chat_id, message_index):
+        return message_index < len(CHATS.get(owner, {}).get(chat_id, []))
+
+    results = []
+    for score, owner, chat_id, message_index, timestamp in SEARCH_INDEX.search(query, usernames, limit, is_live):
+        message = CHATS[owner][chat_id][message_index]
+        results.append({
+            'chat_id': chat_id,
+            'username': owner,
+            'message_index': message_index,
+            'timestamp_ms': int(timestamp * 1000) if timestamp else None,
+            'role': message.get('role'),
+            'score': round(score, 4),
+            'snippet': make_snippet(message.get('content'), query)
+        })
+
+    return jsonify({'query': query, 'results': results})
+
+@app.route('/api/admin/upstream-metrics')
+@admin_required
+def upstream_metrics():
+    """Per-upstream call, coalesce and throttle counters plus client reuse stats."""
+    return jsonify({'upstreams': get_upstream_metrics(), 'clients': CLIENTS.stats()})
+
+def parse_time_range(args):
+    """Read optional ``since``/``until`` unix timestamps from query args."""
+    since = args.get('since', type=float)
+    until = args.get('until', type=float)
+    return since, until
+
+def filter_messages(messages, since, until):
+    """Yield messages whose timestamp falls within [since, until]."""
+    for message in messages:
+        timestamp = message.get('timestamp') or 0
+        if since is not None and timestamp < since:
+            continue
+        if until is not None and timestamp > until:
+            continue
+        yield message
+
+def iter_export_records(user_filter, since, until):
+    """Yield one NDJSON line per chat, walking users and chats lazily."""
+    for username in list(CHATS.keys()):
+        if user_filter and username not in user_filter:
+            continue
+        user_chats = CHATS.get(username, {})
+        for chat_id in list(user_chats.keys()):
+            messages = list(filter_messages(user_chats.get(chat_id, []), since, until))
+            if not messages and (since is not None or until is not None):
+                continue
+            yield json.dumps({'username': username, 'chat_id': chat_id, 'messages': messages}) + '\n'
+
+def gzip_stream(lines):
+    """Compress an iterable of text lines into a gzip byte stream."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for line in lines:
+        chunk = compressor.compress(line.encode('utf-8'))
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+@app.route('/api/admin/export')
+@admin_required
+def export_chats():
+    """Stream chat history as NDJSON, optionally gzip-compressed."""
+    user_filter = set(request.args.getlist('user'))
+    since, until = parse_time_range(request.args)
+    records = iter_export_records(user_filter, since, until)
+
+    if request.args.get('gzip', '').lower() in ('1', 'true', 'yes'):
+        return Response(gzip_stream(records), mimetype='application/gzip', headers={
+            'Content-Disposition': 'attachment; filename=chats.ndjson.gz'
+        })
+
+    return Response(records, mimetype='application/x-ndjson', headers={
+        'Content-Disposition': 'attachment; filename=chats.ndjson'
+    })
+
+def iter_import_lines(stream):
+    """Yield (line_number, line) pairs; a corrupt, truncated or dropped stream yields a final None."""
+    line_number = 0
+    try:
+        for line_number, raw in enumerate(stream, 1):
+            yield line_number, raw
+    except (OSError, EOFError, zlib.error, ClientDisconnected) as e:
+        print(f"Import stream ended early after line {line_number}: {e}")
+        yield line_number + 1, None
+
+def parse_import_record(raw):
+    """Validate one NDJSON import line, returning (username, chat_id, messages)."""
+    record = json.loads(raw)
+    if not isinstance(record, dict):
+        raise ValueError('record is not an object')
+    username = record['username']
+    if not isinstance(username, str) or not username:
+        raise ValueError('username must be a non-empty string')
+    chat_id = str(record['chat_id'])
+    messages = record.get('messages', [])
+    if not isinstance(messages, list):
+        raise ValueError('messages must be a list')
+    for message in messages:
+        if not isinstance(message, dict):
+            raise ValueError('each message must be an object')
+        if not isinstance(message.get('role'), str):
+            raise ValueError('message role must be a string')
+        if not isinstance(message.get('content', ''), (str, type(None))):
+            raise ValueError('message content must be a string')
+        timestamp = message.get('timestamp')
+        if timestamp is not None and (isinstance(timestamp, bool) or not isinstance(timestamp, (int, float))):
+            raise ValueError('message timestamp must be a number')
+    return username, chat_id, messages
+
+@app.route('/api/admin/import', methods=['POST'])
+@admin_required
+def import_chats():
+    """Import NDJSON chat history streamed in the request body.
+
+    Each line is ``{"username", "chat_id", "messages"}`` as produced by the
+    export endpoint. The body may be gzip-compressed. Existing chats are left
+    untouched unless ``overwrite=1`` is given.
+    """
+    user_filter = set(request.args.getlist('user'))
+    since, until = parse_time_range(request.args)
+    overwrite = request.args.get('overwrite', '').lower() in ('1', 'true', 'yes')
+
+    # Bypass MAX_CONTENT_LENGTH: archives are read line by line, never buffered whole
+    stream = get_input_stream(request.environ, max_content_length=None)
+    if request.headers.get('Content-Encoding') == 'gzip' or request.mimetype == 'application/gzip':
+        stream = gzip.GzipFile(fileobj=stream, mode='rb')
+
+    stats = {'imported_chats': 0, 'imported_messages': 0, 'skipped_chats': 0, 'errors': 0}
+    try:
+        for line_number, raw in iter_import_lines(stream):
+            if raw is None:
+                # Keep what was imported so far; the partial archive is reported as an error
+                stats['errors'] += 1
+                break
+            raw = raw.strip()
+            if not raw:
+                continue
+            try:
+                username, chat_id, messages = parse_import_record(raw)
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Skipping invalid import line {line_number}: {e}")
+                stats['errors'] += 1
+                continue
+
+            if user_filter and username not in user_filter:
+                continue
+
+            user_chats = CHATS.setdefault(username, {})
+            if chat_id in user_chats and not overwrite:
+                stats['skipped_chats'] += 1
+                continue
+
+            user_chats[chat_id] = []
+            touch_chat(username, chat_id)
+            for message in filter_messages(messages, since, until):
+                append_message(username, chat_id, message)
+                stats['imported_messages'] += 1
+            stats['imported_chats'] += 1
+    finally:
+        # Always persist and reindex whatever was imported, even if the request failed midway
+        if overwrite:
+            # Overwritten chats leave stale postings behind, so rebuild once at the end
+            SEARCH_INDEX.build(CHATS)
+        save_chats_to_file()
+
+    return jsonify({'success': True, **stats})
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -561,7 +1002,7 @@ def health_check():
         'status': 'healthy',
         'timestamp': time.time(),
         'environment': 'production' if os.getenv('PRODUCTION') else 'development',
-        'openai_client': 'initialized' if client is not None else 'not initialized',
+        'openai_client': 'initialized' if get_client() is not None else 'not initialized',
         'upload_folder': UPLOAD_FOLDER,
         'upload_folder_exists': os.path.exists(UPLOAD_FOLDER)
     }
@@ -635,7 +1076,7 @@ def upload_file():
 @app.route('/generate', methods=['POST'])
 def generate():
     try:
-        if client is None:
+        if get_client() is None:
             return jsonify({
                 'success': False,
                 'error': 'OpenAI client is not initialized. Please check your API key.'
@@ -679,7 +1120,7 @@ def generate():
         print(f"Sending request to OpenAI with {len(messages)} messages")  # Debug print
         
         # Configure the completion with the latest options
-        completion = client.with_options(timeout=30.0).chat.completions.create(
+        completion = get_client().with_options(timeout=30.0).chat.completions.create(
             model="gpt-4o-mini",  # Using the base model which points to latest version
             messages=messages,
             temperature=0.7,
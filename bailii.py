@@ -1,33 +1,430 @@
 import os
+import re
+import math
+import time
+import heapq
 import asyncio
+import hashlib
+import threading
+from collections import defaultdict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 from playwright.async_api import async_playwright
 from steel import Steel
-from dotenv import load_dotenv
 
 load_dotenv()
 
+def upstream_setting(name, setting, default):
+    """Read a per-upstream tunable such as URLTOTEXT_POOL_SIZE from the environment.
+
+    Integer settings accept whole-number floats ("10.0"); anything else fails
+    with a message naming the variable.
+    """
+    key = f"{name.upper().replace('.', '_')}_{setting}"
+    raw = os.getenv(key)
+    if raw is None:
+        return default
+    try:
+        value = float(raw)
+    except ValueError:
+        raise ValueError(f"{key} must be a number, got {raw!r}") from None
+    if isinstance(default, int):
+        if not value.is_integer():
+            raise ValueError(f"{key} must be a whole number, got {raw!r}")
+        return int(value)
+    return value
+
+# Counters for coalesced and throttled upstream calls, keyed by upstream name
+UPSTREAM_METRICS = defaultdict(lambda: defaultdict(float))
+_metrics_lock = threading.Lock()
+
+def record_metric(upstream, name, amount=1):
+    with _metrics_lock:
+        UPSTREAM_METRICS[upstream][name] += amount
+
+def get_upstream_metrics():
+    """Snapshot of per-upstream call, coalesce and throttle counters."""
+    with _metrics_lock:
+        return {upstream: dict(counters) for upstream, counters in UPSTREAM_METRICS.items()}
+
+class TokenBucket:
+    """Thread-safe token bucket shared by every event loop in the process."""
+
+    def __init__(self, name, rate, capacity):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _reserve(self):
+        """Take a token, returning how long the caller must wait before using it."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    async def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            record_metric(self.name, 'throttled')
+            record_metric(self.name, 'throttled_seconds', wait)
+            await asyncio.sleep(wait)
+
+class _InFlightCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Share one in-flight operation between concurrent callers with the same key.
+
+    Callers may come from different threads, each running its own event loop
+    via ``asyncio.run``, so waiting is done on a threading.Event.
+    """
+
+    def __init__(self, name, timeout=300):
+        self.name = name
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    async def do(self, key, func, timeout=None):
+        """Run ``func`` or wait for the identical call already in flight.
+
+        Waiters give up after ``timeout`` seconds (default ``self.timeout``).
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _InFlightCall()
+
+        if not leader:
+            record_metric(self.name, 'coalesced')
+            wait = timeout if timeout is not None else self.timeout
+            finished = await asyncio.get_running_loop().run_in_executor(None, call.done.wait, wait)
+            if not finished:
+                raise TimeoutError(f"Timed out waiting for in-flight {self.name} call")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = await func()
+            return call.result
+        except BaseException as e:
+            # Includes CancelledError, so waiters never see a missing result
+            call.error = e if isinstance(e, Exception) else RuntimeError(
+                f"In-flight {self.name} call was cancelled")
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+def _bucket_from_env(name, default_rate, default_burst):
+    prefix = name.upper().replace('.', '_')
+    rate = upstream_setting(name, 'RATE_PER_SEC', float(default_rate))
+    burst = upstream_setting(name, 'BURST', float(default_burst))
+    if rate <= 0 or burst < 1:
+        raise ValueError(f"{prefix}_RATE_PER_SEC must be > 0 and {prefix}_BURST >= 1 "
+                         f"(got {rate} and {burst})")
+    return TokenBucket(name, rate, burst)
+
+# Global limits per upstream, tunable through environment variables
+RATE_LIMITERS = {
+    'steel': _bucket_from_env('steel', 0.5, 2),
+    'bailii.org': _bucket_from_env('bailii.org', 1, 3),
+    'urltotext': _bucket_from_env('urltotext', 2, 4),
+}
+
+SEARCH_FLIGHTS = SingleFlight('search', timeout=upstream_setting('search', 'FLIGHT_TIMEOUT', 300))
+FETCH_FLIGHTS = SingleFlight('urltotext', timeout=upstream_setting('fetch', 'FLIGHT_TIMEOUT', 90))
+
+def normalise_query(query):
+    """Collapse case and whitespace so equivalent searches share one flight."""
+    return re.sub(r'\s+', ' ', (query or '').strip().lower())
+
+# Navigation chrome, breadcrumbs and footer that BAILII wraps around every document
+BOILERPLATE_PATTERNS = [
+    re.compile(r'\[\s*(?:Home|Databases|World Law|Multidatabase Search|Help|Feedback|New search|'
+               r'Printable (?:PDF|RTF) version|Context|Hide Context|No Context|'
+               r'View without highlighting)\s*\]', re.IGNORECASE),
+    re.compile(r'You are here:\s*BAILII(?:\s*>>[^>\n]{0,150}?)*\s*>>'),
+    re.compile(r'BAILII:\s*Copyright Policy.*?Donate to BAILII', re.DOTALL),
+    re.compile(r'URL:\s*https?://www\.bailii\.org/\S+'),
+]
+
+# Rough chars-per-token ratio used to keep passages within the summariser budget
+CHARS_PER_TOKEN = 4
+PASSAGE_TOKEN_BUDGET = upstream_setting('passage', 'TOKEN_BUDGET', 2000)
+PASSAGE_MAX_WORDS = 150
+
+def strip_boilerplate(text):
+    """Remove BAILII navigation and footer chrome from fetched page text."""
+    text = text.replace('\ufeff', '')
+    for pattern in BOILERPLATE_PATTERNS:
+        text = pattern.sub(' ', text)
+    return text
+
+def split_passages(text, max_words=PASSAGE_MAX_WORDS):
+    """Split text into paragraphs, breaking long runs into word windows.
+
+    Fetched pages often arrive as one long line, so numbered judgment
+    paragraphs ("[12] ...") are also treated as boundaries.
+    """
+    passages = []
+    for block in re.split(r'\n\s*\n|\s(?=\[\d+\]\s)', text):
+        words = block.split()
+        for start in range(0, len(words), max_words):
+            passage = ' '.join(words[start:start + max_words])
+            if passage:
+                passages.append(passage)
+    return passages
+
+def _terms(text):
+    return re.findall(r'[a-z0-9]+', text.lower())
+
+def rank_passages(passages, query, k1=1.2, b=0.75):
+    """Score each passage against the query with BM25."""
+    query_terms = set(_terms(query))
+    docs = [_terms(p) for p in passages]
+    if not docs or not query_terms:
+        return [0.0] * len(passages)
+    avg_len = sum(len(d) for d in docs) / len(docs) or 1
+    df = {t: sum(1 for d in docs if t in d) for t in query_terms}
+    scores = []
+    for doc in docs:
+        score = 0.0
+        for term in query_terms:
+            tf = doc.count(term)
+            if not tf:
+                continue
+            idf = math.log(1 + (len(docs) - df[term] + 0.5) / (df[term] + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(doc) / avg_len))
+        scores.append(score)
+    return scores
+
+def reduce_document(text, query, token_budget=PASSAGE_TOKEN_BUDGET):
+    """Strip boilerplate and keep only the passages most relevant to the query.
+
+    The opening passage (title and citation) is always kept; the rest are
+    chosen by score until the token budget is spent and emitted in document
+    order, with gaps marked by "[...]".
+    """
+    passages = split_passages(strip_boilerplate(text))
+    if not passages:
+        return ''
+    char_budget = token_budget * CHARS_PER_TOKEN
+    if sum(len(p) for p in passages) <= char_budget:
+        return '\n\n'.join(passages)
+
+    scores = rank_passages(passages, query)
+    chosen = {0}
+    used = len(passages[0])
+    for i in sorted(range(1, len(passages)), key=lambda i: scores[i], reverse=True):
+        if scores[i] <= 0:
+            break
+        if used + len(passages[i]) > char_budget:
+            continue
+        chosen.add(i)
+        used += len(passages[i])
+
+    parts = []
+    previous = -1
+    for i in sorted(chosen):
+        if i != previous + 1:
+            parts.append('[...]')
+        parts.append(passages[i])
+        previous = i
+    return '\n\n'.join(parts)
+
+# Number of distinct documents to summarise, and the most we will fetch to find them
+MAX_RESULTS = 3
+MAX_FETCHES = upstream_setting('bailii', 'MAX_FETCHES', 6)
+SHINGLE_SIZE = 5
+MINHASH_SIZE = 128
+NEAR_DUPLICATE_THRESHOLD = upstream_setting('near_duplicate', 'THRESHOLD', 0.8)
+
+# Query parameters that only control search-term highlighting
+HIGHLIGHT_PARAMS = {'query', 'method', 'highlight'}
+
+def canonicalize_url(url):
+    """Map highlighted/format.cgi BAILII links onto the plain document URL."""
+    parts = urlsplit(url)
+    netloc = parts.netloc.lower()
+    params = parse_qsl(parts.query, keep_blank_values=True)
+    if netloc.endswith('bailii.org') and parts.path.endswith('/format.cgi'):
+        doc = dict(params).get('doc')
+        if doc:
+            return urlunsplit(('https', 'www.bailii.org', doc, '', ''))
+    query = urlencode([(k, v) for k, v in params if k.lower() not in HIGHLIGHT_PARAMS])
+    scheme = 'https' if netloc.endswith('bailii.org') else parts.scheme
+    return urlunsplit((scheme, netloc, parts.path, query, ''))
+
+def minhash_signature(text, size=MINHASH_SIZE, shingle_size=SHINGLE_SIZE):
+    """Bottom-k MinHash sketch over word shingles of the text."""
+    words = _terms(text)
+    shingles = {
+        ' '.join(words[i:i + shingle_size])
+        for i in range(max(1, len(words) - shingle_size + 1))
+    }
+    hashes = {
+        int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for shingle in shingles
+    }
+    return set(heapq.nsmallest(size, hashes))
+
+def estimate_similarity(a, b, size=MINHASH_SIZE):
+    """Estimate Jaccard similarity of two bottom-k signatures."""
+    if not a or not b:
+        return 0.0
+    union_sketch = heapq.nsmallest(size, a | b)
+    shared = a & b
+    return sum(1 for h in union_sketch if h in shared) / len(union_sketch)
+
+class ClientRegistry:
+    """Process-wide registry of upstream clients.
+
+    Each client is built once per process on first use, so gunicorn workers
+    create their own after fork instead of sharing sockets with the master.
+    Clients registered with ``per_thread=True`` (requests sessions, which are
+    not thread-safe) get one instance per thread instead.
+    """
+
+    def __init__(self):
+        self.factories = {}
+        self.per_thread = set()
+        # name -> [(pid, client)] for every client built, used for stats
+        self.clients = defaultdict(list)
+        self.shared = {}
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def register(self, name, factory, per_thread=False):
+        self.factories[name] = factory
+        if per_thread:
+            self.per_thread.add(name)
+
+    def _build(self, name, pid):
+        client = self.factories[name]()
+        with self.lock:
+            self.clients[name].append((pid, client))
+        return client
+
+    def get(self, name):
+        pid = os.getpid()
+        if name in self.per_thread:
+            if getattr(self.local, 'pid', None) != pid:
+                self.local.pid = pid
+                self.local.clients = {}
+            if name not in self.local.clients:
+                self.local.clients[name] = self._build(name, pid)
+            return self.local.clients[name]
+
+        with self.lock:
+            entry = self.shared.get(name)
+            if entry is not None and entry[0] == pid:
+                return entry[1]
+            client = self.factories[name]()
+            self.clients[name].append((pid, client))
+            self.shared[name] = (pid, client)
+            return client
+
+    def stats(self):
+        """Creation counts and, for requests sessions, connection reuse."""
+        pid = os.getpid()
+        with self.lock:
+            clients = {name: [c for owner, c in entries if owner == pid]
+                       for name, entries in self.clients.items()}
+        stats = {}
+        for name, built in clients.items():
+            info = {'created': len(built)}
+            sessions = [c for c in built if isinstance(c, requests.Session)]
+            if sessions:
+                connections = 0
+                requests_sent = 0
+                for session in sessions:
+                    for adapter in session.adapters.values():
+                        pools = adapter.poolmanager.pools
+                        for key in pools.keys():
+                            pool = pools[key]
+                            connections += pool.num_connections
+                            requests_sent += pool.num_requests
+                info.update({
+                    'connections_opened': connections,
+                    'requests': requests_sent,
+                    'connections_reused': max(0, requests_sent - connections)
+                })
+            stats[name] = info
+        return stats
+
+def _count_request(name):
+    return lambda request: record_metric(name, 'http_requests')
+
+def make_httpx_client(name, default_pool_size=10, default_timeout=30.0):
+    """Pooled keep-alive httpx client for SDKs that accept ``http_client``."""
+    pool_size = upstream_setting(name, 'POOL_SIZE', default_pool_size)
+    return httpx.Client(
+        timeout=upstream_setting(name, 'TIMEOUT', default_timeout),
+        limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        event_hooks={'request': [_count_request(name)]}
+    )
+
+def make_steel_client():
+    return Steel(
+        steel_api_key=os.getenv('STEEL_API_KEY'),
+        http_client=make_httpx_client('steel'),
+    )
+
+def make_urltotext_session():
+    pool_size = upstream_setting('urltotext', 'POOL_SIZE', 10)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                          max_retries=upstream_setting('urltotext', 'RETRIES', 1))
+    session.mount('https://', adapter)
+    session.headers.update({
+        'Authorization': f"Token {os.getenv('URLTOTEXT_API_TOKEN')}",
+        'Content-Type': 'application/json'
+    })
+    return session
+
+CLIENTS = ClientRegistry()
+CLIENTS.register('steel', make_steel_client)
+CLIENTS.register('urltotext', make_urltotext_session, per_thread=True)
+
+class FetchError(Exception):
+    """Raised when urltotext cannot return content for a page."""
+
 class BailiiScraper:
     def __init__(self):
-        # Load environment variables
-        load_dotenv()
-        
-        # Initialize Steel client
-        self.client = Steel(
-            steel_api_key=os.getenv('STEEL_API_KEY'),
-        )
-        # Load API token from environment variables
-        self.api_token = os.getenv('URLTOTEXT_API_TOKEN')
+        # Upstream clients are shared across calls; see ClientRegistry
+        self.client = CLIENTS.get('steel')
+        self.timeout = upstream_setting('urltotext', 'TIMEOUT', 30.0)
 
     async def scrape_page_content(self, url):
-        """Scrape content from a specific page using the new scraper API."""
+        """Scrape content from a specific page using the new scraper API.
+
+        Concurrent fetches of the same URL share a single upstream request.
+        Raises FetchError if the page could not be fetched.
+        """
+        return await FETCH_FLIGHTS.do(url, lambda: self._scrape_page_content(url))
+
+    async def _scrape_page_content(self, url):
+        record_metric('urltotext', 'calls')
+        await RATE_LIMITERS['urltotext'].acquire()
         try:
             api_url = 'https://urltotext.com/api/v1/urltotext/'
-            headers = {
-                'Authorization': f'Token {self.api_token}',
-                'Content-Type': 'application/json'
-            }
             data = {
                 'url': url,
                 'output_format': 'text',
@@ -35,20 +432,35 @@ class BailiiScraper:
                 'render_javascript': False,
                 'residential_proxy': False
             }
-            response = requests.post(api_url, headers=headers, json=data, timeout=30)
-            
-            if response.status_code == requests.codes.ok:
-                content = response.json().get('data', {}).get('content', '')
-                # Remove newlines from the content
-                content = content.replace('\n', ' ')
-                return content
-            else:
-                return f"Error: {response.status_code}, {response.text}"
+            # Sessions are per thread, so look it up on the thread doing the fetch
+            session = CLIENTS.get('urltotext')
+            response = session.post(api_url, json=data, timeout=self.timeout)
         except Exception as e:
-            return str(e)
+            raise FetchError(str(e)) from e
+
+        if response.status_code != requests.codes.ok:
+            raise FetchError(f"Error: {response.status_code}, {response.text[:200]}")
+        try:
+            # Keep newlines so paragraph boundaries survive until reduce_document
+            content = response.json().get('data', {}).get('content') or ''
+        except (ValueError, AttributeError) as e:
+            raise FetchError(f"Error: invalid response body ({e})") from e
+        if not content.strip():
+            raise FetchError("Error: empty content")
+        return content
 
     async def run_scraper(self, search_query):
+        """Search BAILII, coalescing concurrent identical (normalised) queries."""
+        results = await SEARCH_FLIGHTS.do(
+            normalise_query(search_query),
+            lambda: self._run_scraper(search_query)
+        )
+        return list(results)
+
+    async def _run_scraper(self, search_query):
         # Create a Steel session with additional features
+        record_metric('steel', 'calls')
+        await RATE_LIMITERS['steel'].acquire()
         session = self.client.sessions.create(
             use_proxy=False,
             solve_captcha=False,
@@ -69,6 +481,8 @@ class BailiiScraper:
                 page = await context.new_page()
                 
                 # Navigate to BAILII
+                record_metric('bailii.org', 'calls')
+                await RATE_LIMITERS['bailii.org'].acquire()
                 await page.goto("https://www.bailii.org/")
                 await page.get_by_role("textbox").click()
                 await page.get_by_role("textbox").fill(search_query)
@@ -91,8 +505,13 @@ class BailiiScraper:
                         }));
                 }''')
                 
-                # Limit to top 3 links
-                collected_links = links[:3]
+                # Canonicalise and drop exact duplicates; later links backfill near-duplicates
+                seen_urls = set()
+                for link in links:
+                    link['url'] = canonicalize_url(link['url'])
+                    if link['url'] not in seen_urls:
+                        seen_urls.add(link['url'])
+                        collected_links.append(link)
                 
                 # Clean up Playwright resources
                 await context.close()
@@ -106,12 +525,33 @@ class BailiiScraper:
         if collected_links:
             print("\nStarting detailed content scraping with API...")
             
-            # Process links with the API
-            for i, link in enumerate(collected_links, 1):
-                print(f"Scraping {i}/{len(collected_links)}: {link['text'][:40]}...")
-                result = await self.scrape_page_content(link['url'])
-                print(f"Content from {link['url']}:\n{result}\n")
-                scraped_contents.append(result) # Store scraped content
+            signatures = []
+            fetches = 0
+
+            # Process links with the API until MAX_RESULTS distinct documents are found
+            for link in collected_links:
+                if len(scraped_contents) >= MAX_RESULTS or fetches >= MAX_FETCHES:
+                    break
+                fetches += 1
+                print(f"Scraping {fetches}/{MAX_FETCHES}: {link['text'][:40]}...")
+                try:
+                    result = await self.scrape_page_content(link['url'])
+                except FetchError as e:
+                    # Failed fetches free their slot for the next link, like near-duplicates
+                    print(f"Skipping {link['url']}: {e}")
+                    record_metric('urltotext', 'failed')
+                    continue
+
+                signature = minhash_signature(strip_boilerplate(result))
+                if any(estimate_similarity(signature, other) >= NEAR_DUPLICATE_THRESHOLD for other in signatures):
+                    print(f"Skipping near-duplicate of an earlier result: {link['url']}")
+                    continue
+                signatures.append(signature)
+
+                # Send only boilerplate-free, query-relevant passages to the summariser
+                reduced = reduce_document(result, search_query)
+                print(f"Content from {link['url']}: reduced {len(result)} to {len(reduced)} chars")
+                scraped_contents.append(f"Source: {link['url']}\n\n{reduced}") # Store scraped content
                 # Small delay to avoid overwhelming the server
                 await asyncio.sleep(1)
                 
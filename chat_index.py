@@ -0,0 +1,145 @@
+import math
+import re
+import threading
+from collections import defaultdict
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'in',
+    'is', 'it', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'with'
+}
+
+
+def tokenize(text):
+    """Lowercase and split text into index terms, dropping stopwords."""
+    if not text:
+        return []
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class ChatSearchIndex:
+    """In-memory inverted index over chat message content, scoped per user.
+
+    Postings are keyed by (username, chat_id, message_index) so a hit can be
+    resolved back to a single message without walking the whole history.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        # term -> username -> {(chat_id, message_index): term_frequency}
+        self._postings = defaultdict(lambda: defaultdict(dict))
+        # (username, chat_id, message_index) -> (length, timestamp)
+        self._docs = {}
+        # (username, chat_id, message_index) -> indexed terms, so a rewrite can drop old postings
+        self._doc_terms = {}
+        self._total_length = 0
+
+    def clear(self):
+        with self._lock:
+            self._postings.clear()
+            self._docs.clear()
+            self._doc_terms.clear()
+            self._total_length = 0
+
+    def _remove_locked(self, doc_key):
+        username, chat_id, message_index = doc_key
+        for term in self._doc_terms.pop(doc_key, ()):
+            by_user = self._postings.get(term)
+            if not by_user:
+                continue
+            by_user[username].pop((chat_id, message_index), None)
+            if not by_user[username]:
+                del by_user[username]
+            if not by_user:
+                del self._postings[term]
+        if doc_key in self._docs:
+            self._total_length -= self._docs.pop(doc_key)[0]
+
+    def add_message(self, username, chat_id, message_index, message):
+        """Index a single message, replacing anything indexed at the same position."""
+        terms = tokenize(message.get('content'))
+        doc_key = (username, chat_id, message_index)
+        counts = defaultdict(int)
+        for term in terms:
+            counts[term] += 1
+        with self._lock:
+            self._remove_locked(doc_key)
+            if not terms:
+                return
+            self._docs[doc_key] = (len(terms), message.get('timestamp'))
+            self._doc_terms[doc_key] = list(counts)
+            self._total_length += len(terms)
+            for term, tf in counts.items():
+                self._postings[term][username][(chat_id, message_index)] = tf
+
+    def build(self, chats):
+        """Rebuild the index from a full CHATS mapping (used on startup)."""
+        self.clear()
+        for username, user_chats in chats.items():
+            for chat_id, messages in user_chats.items():
+                for i, message in enumerate(messages):
+                    self.add_message(username, chat_id, i, message)
+
+    def search(self, query, usernames=None, limit=20, is_live=None):
+        """Return (score, username, chat_id, message_index, timestamp) tuples.
+
+        ``usernames`` restricts the search to those users; ``None`` searches
+        every user (admin scope). ``is_live(username, chat_id, message_index)``
+        drops stale postings before the limit is applied.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            n_docs = len(self._docs)
+            if not n_docs:
+                return []
+            avg_len = self._total_length / n_docs
+            scores = defaultdict(float)
+            for term in terms:
+                by_user = self._postings.get(term)
+                if not by_user:
+                    continue
+                df = sum(len(p) for p in by_user.values())
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                users = by_user.keys() if usernames is None else [u for u in usernames if u in by_user]
+                for username in users:
+                    for (chat_id, message_index), tf in by_user[username].items():
+                        length = self._docs[(username, chat_id, message_index)][0]
+                        norm = tf + self.k1 * (1 - self.b + self.b * length / avg_len)
+                        scores[(username, chat_id, message_index)] += idf * tf * (self.k1 + 1) / norm
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+            results = []
+            if limit < 1:
+                return results
+            for doc_key, score in ranked:
+                if is_live is not None and not is_live(*doc_key):
+                    continue
+                results.append((score, *doc_key, self._docs[doc_key][1]))
+                if len(results) >= limit:
+                    break
+            return results
+
+
+def make_snippet(content, query, width=160):
+    """Cut a window of ``content`` around the first query term it contains as a word."""
+    text = re.sub(r'\s+', ' ', content or '').strip()
+    if len(text) <= width:
+        return text
+    # Match whole tokens, as indexed, so "art" does not centre on "start"
+    terms = set(tokenize(query))
+    start = 0
+    for match in TOKEN_RE.finditer(text.lower()):
+        if match.group() in terms:
+            start = max(0, match.start() - width // 3)
+            break
+    end = min(len(text), start + width)
+    snippet = text[start:end]
+    if start > 0:
+        snippet = '...' + snippet
+    if end < len(text):
+        snippet += '...'
+    return snippet
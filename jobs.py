@@ -0,0 +1,247 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import traceback
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    dedupe_key TEXT,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_dedupe_key ON jobs (dedupe_key, status);
+"""
+
+
+class JobQueue:
+    """Persistent background job queue backed by SQLite.
+
+    Jobs survive worker restarts: a running job renews its lease with a
+    heartbeat, and anything whose lease lapses is put back on the queue. Each
+    process runs a small pool of worker threads; ``ensure_started`` is safe to
+    call from any entry point and (re)starts the pool once per process.
+    Several processes can share the same database file since jobs are claimed
+    with a single UPDATE.
+    """
+
+    def __init__(self, db_path, max_workers=2, lease_seconds=90, result_ttl=3600,
+                 max_attempts=2, poll_interval=0.5):
+        self.db_path = db_path
+        self.max_workers = max_workers
+        self.lease_seconds = lease_seconds
+        # Running jobs renew their lease well before it can expire
+        self.heartbeat_interval = lease_seconds / 3
+        self.result_ttl = result_ttl
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.handlers = {}
+        self._wakeup = threading.Event()
+        self._start_lock = threading.Lock()
+        self._started_pid = None
+        self._local = threading.local()
+        self._sweep_lock = threading.Lock()
+        self._last_sweep = 0.0
+
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def register(self, kind, handler):
+        """Register ``handler(payload) -> result`` for jobs of ``kind``."""
+        self.handlers[kind] = handler
+
+    def ensure_started(self):
+        """Start the worker pool once per process (i.e. after fork)."""
+        with self._start_lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+            for i in range(self.max_workers):
+                threading.Thread(target=self._worker_loop, name=f'job-worker-{i}', daemon=True).start()
+            print(f"Started {self.max_workers} job workers in process {os.getpid()}")
+
+    def submit(self, kind, payload, dedupe_key=None):
+        """Queue a job and return its id.
+
+        If a job with the same ``dedupe_key`` is pending, or finished within
+        ``result_ttl``, that job's id is returned instead so its result is reused.
+        """
+        self.ensure_started()
+        now = time.time()
+        conn = self._connect()
+        if dedupe_key:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE dedupe_key = ? AND "
+                "(status IN (?, ?) OR (status = ? AND updated_at >= ?)) "
+                "ORDER BY created_at DESC LIMIT 1",
+                (dedupe_key, QUEUED, RUNNING, DONE, now - self.result_ttl)
+            ).fetchone()
+            if row:
+                return row['id']
+
+        job_id = str(uuid.uuid4())
+        conn.execute(
+            "INSERT INTO jobs (id, kind, payload, dedupe_key, status, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, json.dumps(payload), dedupe_key, QUEUED, now, now)
+        )
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        """Return the job as a dict, or None if it does not exist."""
+        self.ensure_started()
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
+
+    def wait(self, job_id, timeout=None, interval=1.0, keepalive=None):
+        """Yield the job each time its status changes until it finishes.
+
+        With ``keepalive`` the current job is also re-yielded after that many
+        seconds without a change, so callers can keep a stream alive.
+        """
+        deadline = time.time() + timeout if timeout else None
+        last_status = None
+        last_yield = time.time()
+        while True:
+            job = self.get(job_id)
+            if job is None:
+                return
+            if job['status'] != last_status or (keepalive and time.time() - last_yield >= keepalive):
+                last_status = job['status']
+                last_yield = time.time()
+                yield job
+            if job['status'] in (DONE, FAILED):
+                return
+            if deadline and time.time() >= deadline:
+                return
+            time.sleep(interval)
+
+    def _sweep(self, conn):
+        """Requeue jobs whose lease lapsed and purge finished jobs past result_ttl.
+
+        Runs at most once per heartbeat_interval per process rather than on
+        every poll, to keep write-lock contention down.
+        """
+        now = time.time()
+        with self._sweep_lock:
+            if now - self._last_sweep < self.heartbeat_interval:
+                return
+            self._last_sweep = now
+        conn.execute(
+            "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+            "error = CASE WHEN attempts >= ? THEN 'Job lease expired' ELSE error END, "
+            "updated_at = ? WHERE status = ? AND updated_at < ?",
+            (self.max_attempts, FAILED, QUEUED, self.max_attempts, now,
+             RUNNING, now - self.lease_seconds)
+        )
+        conn.execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+            (DONE, FAILED, now - self.result_ttl)
+        )
+
+    def _claim(self):
+        conn = self._connect()
+        self._sweep(conn)
+        row = conn.execute(
+            "SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+        ).fetchone()
+        if row is None:
+            return None
+        claimed = conn.execute(
+            "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ? "
+            "WHERE id = ? AND status = ?",
+            (RUNNING, time.time(), row['id'], QUEUED)
+        ).rowcount
+        # Another worker may have claimed it first
+        return self.get(row['id']) if claimed else None
+
+    def _heartbeat(self, job, stop):
+        while not stop.wait(self.heartbeat_interval):
+            try:
+                self._connect().execute(
+                    "UPDATE jobs SET updated_at = ? WHERE id = ? AND status = ? AND attempts = ?",
+                    (time.time(), job['id'], RUNNING, job['attempts'])
+                )
+            except sqlite3.Error as e:
+                print(f"Error renewing lease for job {job['id']}: {e}")
+
+    def _finish(self, job, status, result=None, error=None):
+        """Record the outcome unless the lease was lost and the job re-claimed.
+
+        Errors are logged rather than raised so a busy database cannot kill
+        the worker thread.
+        """
+        try:
+            updated = self._connect().execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? "
+                "WHERE id = ? AND status = ? AND attempts = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(),
+                 job['id'], RUNNING, job['attempts'])
+            ).rowcount
+            if not updated:
+                print(f"Discarding outcome of job {job['id']}: lease was lost")
+        except sqlite3.Error as e:
+            print(f"Error finishing job {job['id']}: {e}")
+
+    def _worker_loop(self):
+        while True:
+            try:
+                job = self._claim()
+            except sqlite3.Error as e:
+                print(f"Error claiming job: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            handler = self.handlers.get(job['kind'])
+            if handler is None:
+                self._finish(job, FAILED, error=f"No handler for job kind '{job['kind']}'")
+                continue
+
+            print(f"Running job {job['id']} ({job['kind']})")
+            stop = threading.Event()
+            threading.Thread(target=self._heartbeat, args=(job, stop), daemon=True).start()
+            try:
+                result = handler(job['payload'])
+            except Exception as e:
+                print(f"Job {job['id']} failed: {e}")
+                traceback.print_exc()
+                self._finish(job, FAILED, error=str(e))
+            else:
+                self._finish(job, DONE, result=result)
+            finally:
+                stop.set()
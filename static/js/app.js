@@ -0,0 +1,242 @@
+let conversationHistory = [];
+let currentFile = null;
+let currentFileContent = null;
+let currentChatId = null;
+
+// Function to format timestamp
+function formatTimestamp(timestamp) {
+    const date = new Date(timestamp * 1000);
+    return date.toLocaleString();
+}
+
+// Removed updateChatList() as chat list is rendered server side
+
+function startNewChat() {
+    // Create new chat
+    fetch('/api/new-chat', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        }
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            // Instead of dynamically updating the chat list, simply reload the page
+            window.location.reload();
+        }
+    })
+    .catch(error => console.error('Error creating new chat:', error));
+}
+
+function loadChat(chatId) {
+    currentChatId = chatId;
+    // Hide welcome message
+    document.getElementById('welcome-message').style.display = 'none';
+
+    // Optionally, you can implement AJAX call to load chat history
+    // For now, we'll assume the user will interact and new messages update dynamically
+    // Clear current chat display
+    document.getElementById('chat-history').innerHTML = '';
+
+    fetch(`/api/chat/${chatId}`)
+        .then(response => response.json())
+        .then(data => {
+            conversationHistory = data.messages || [];
+            conversationHistory.forEach(msg => {
+                addMessageToHistory(msg.content, msg.role === 'user', msg.timestamp);
+            });
+
+            // Scroll to bottom
+            const chatHistory = document.getElementById('chat-history');
+            chatHistory.scrollTop = chatHistory.scrollHeight;
+        });
+}
+
+function addMessageToHistory(message, isUser, timestamp = null) {
+    document.getElementById('welcome-message').style.display = 'none';
+
+    const messageRow = document.createElement('div');
+    messageRow.className = `message-row ${isUser ? 'user-message' : 'assistant-message'}`;
+
+    const messageContent = document.createElement('div');
+    messageContent.className = 'message-content';
+
+    const avatar = document.createElement('div');
+    avatar.className = `avatar ${isUser ? 'user-avatar' : 'assistant-avatar'}`;
+    avatar.textContent = isUser ? document.body.dataset.userInitial : 'A';
+
+    const messageText = document.createElement('div');
+    messageText.className = 'message-text';
+    if (isUser) {
+        messageText.innerHTML = message;
+    } else {
+        messageText.innerHTML = marked.parse(message);
+    }
+
+    if (timestamp) {
+        const timestampDiv = document.createElement('div');
+        timestampDiv.className = 'message-timestamp';
+        timestampDiv.textContent = formatTimestamp(timestamp);
+        messageContent.appendChild(timestampDiv);
+    }
+
+    messageContent.appendChild(avatar);
+    messageContent.appendChild(messageText);
+    messageRow.appendChild(messageContent);
+
+    const chatHistory = document.getElementById('chat-history');
+    chatHistory.appendChild(messageRow);
+    chatHistory.scrollTop = chatHistory.scrollHeight;
+}
+
+// Auto-resize textarea
+const textarea = document.getElementById('user-input');
+textarea.addEventListener('input', function() {
+    this.style.height = 'auto';
+    this.style.height = (this.scrollHeight) + 'px';
+});
+
+document.getElementById('chat-form').addEventListener('submit', async (e) => {
+    e.preventDefault();
+    const userInput = document.getElementById('user-input').value;
+
+    if (!userInput.trim()) return;
+
+    // Clear input
+    document.getElementById('user-input').value = '';
+    document.getElementById('user-input').style.height = '56px';
+
+    // Hide welcome message if visible
+    document.getElementById('welcome-message').style.display = 'none';
+
+    // Add user message to chat
+    addMessageToHistory(userInput, true, Date.now() / 1000);
+
+    try {
+        const response = await fetch('/api/chat', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                message: userInput,
+                chat_id: currentChatId,
+                file_content: currentFileContent
+            })
+        });
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let assistantMessage = '';
+        let messageElement = null;
+
+        while (true) {
+            const {value, done} = await reader.read();
+            if (done) break;
+
+            const text = decoder.decode(value);
+            const lines = text.split('\n');
+
+            for (const line of lines) {
+                if (line.startsWith('data: ')) {
+                    try {
+                        const data = JSON.parse(line.slice(6));
+
+                        if (!messageElement) {
+                            addMessageToHistory('', false, Date.now() / 1000);
+                            messageElement = document.querySelector('.message-row:last-child .message-text');
+                        }
+
+                        if (data.error) {
+                            if (messageElement) {
+                                messageElement.innerHTML = marked.parse(`${assistantMessage}\n\n_Error: ${data.error}_`);
+                            }
+                        } else if (data.job_status) {
+                            // Background research progress, shown until the answer starts streaming
+                            if (messageElement && !assistantMessage) {
+                                messageElement.innerHTML = marked.parse(`_Researching BAILII (${data.job_status})..._`);
+                            }
+                        } else if (data.content) {
+                            assistantMessage += data.content;
+                            if (messageElement) {
+                                messageElement.innerHTML = marked.parse(assistantMessage);
+                            }
+                        }
+
+                        // Update currentChatId if provided
+                        if (data.chat_id) {
+                            currentChatId = data.chat_id;
+                        }
+                    } catch (e) {
+                        console.error('Error parsing SSE data:', e);
+                    }
+                }
+            }
+        }
+    } catch (error) {
+        console.error('Error:', error);
+    }
+});
+
+document.getElementById('file-form').addEventListener('submit', async (e) => {
+    e.preventDefault();
+    const fileInput = document.getElementById('file-input');
+    const file = fileInput.files[0];
+    const submitButton = e.target.querySelector('button');
+    const buttonText = submitButton.querySelector('.button-text');
+    const loading = submitButton.querySelector('.loading');
+    const uploadedFilesDiv = document.getElementById('uploaded-files');
+
+    if (!file) {
+        uploadedFilesDiv.textContent = 'Please select a file first';
+        uploadedFilesDiv.style.color = '#ff3b30';
+        return;
+    }
+
+    submitButton.disabled = true;
+    buttonText.style.display = 'none';
+    loading.style.display = 'inline-block';
+    uploadedFilesDiv.textContent = 'Uploading...';
+
+    const formData = new FormData();
+    formData.append('file', file);
+
+    try {
+        const response = await fetch('./upload', {
+            method: 'POST',
+            body: formData
+        });
+
+        const data = await response.json();
+        if (data.success) {
+            currentFile = data.filename;
+            currentFileContent = data.content;
+            uploadedFilesDiv.textContent = file.name;
+            uploadedFilesDiv.style.color = '#34c759';
+
+            const previewDiv = document.getElementById('file-preview');
+            const contentDiv = document.getElementById('file-content');
+            contentDiv.textContent = data.content;
+            previewDiv.classList.add('visible');
+
+            addMessageToHistory(`File uploaded: ${file.name}`, true);
+            addMessageToHistory("I've processed your document. What would you like to know about it?", false);
+
+            fileInput.value = '';
+        } else {
+            uploadedFilesDiv.textContent = `Error: ${data.error}`;
+            uploadedFilesDiv.style.color = '#ff3b30';
+        }
+    } catch (error) {
+        uploadedFilesDiv.textContent = 'Error uploading file. Please try again.';
+        uploadedFilesDiv.style.color = '#ff3b30';
+        console.error('Upload error:', error);
+    } finally {
+        submitButton.disabled = false;
+        buttonText.style.display = 'inline';
+        loading.style.display = 'none';
+    }
+});
+
+// Removed DOMContentLoaded updateChatList() call since chat list is rendered server-side